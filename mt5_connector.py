@@ -36,7 +36,7 @@ class MT5Connector:
             bool: True if connection successful, False otherwise
         """
         if not mt5.initialize():
-            self.logger.error(f"MT5 initialization failed: {mt5.last_error()}")
+            self.logger.error("MT5 initialization failed: %s", mt5.last_error())
             return False
 
         authorized = mt5.login(self.login, password=self.password, server=self.server)
@@ -44,11 +44,11 @@ class MT5Connector:
         if authorized:
             self.connected = True
             account_info = mt5.account_info()
-            self.logger.info(f"Connected to MT5 account #{self.login}")
-            self.logger.info(f"Balance: {account_info.balance}, Equity: {account_info.equity}")
+            self.logger.info("Connected to MT5 account #%s", self.login)
+            self.logger.info("Balance: %s, Equity: %s", account_info.balance, account_info.equity)
             return True
         else:
-            self.logger.error(f"MT5 login failed: {mt5.last_error()}")
+            self.logger.error("MT5 login failed: %s", mt5.last_error())
             mt5.shutdown()
             return False
 
@@ -115,13 +115,13 @@ class MT5Connector:
 
         mt5_timeframe = timeframe_map.get(timeframe)
         if mt5_timeframe is None:
-            self.logger.error(f"Invalid timeframe: {timeframe}")
+            self.logger.error("Invalid timeframe: %s", timeframe)
             return None
 
         rates = mt5.copy_rates_from_pos(symbol, mt5_timeframe, 0, count)
 
         if rates is None or len(rates) == 0:
-            self.logger.error(f"Failed to get bars for {symbol}: {mt5.last_error()}")
+            self.logger.error("Failed to get bars for %s: %s", symbol, mt5.last_error())
             return None
 
         df = pd.DataFrame(rates)
@@ -145,7 +145,7 @@ class MT5Connector:
 
         symbol_info = mt5.symbol_info(symbol)
         if symbol_info is None:
-            self.logger.error(f"Symbol {symbol} not found")
+            self.logger.error("Symbol %s not found", symbol)
             return None
 
         return {
@@ -161,6 +161,31 @@ class MT5Connector:
             'filling_mode': symbol_info.filling_mode
         }
 
+    def get_symbol_tick(self, symbol: str) -> Optional[Dict]:
+        """
+        Get latest bid/ask for a symbol (lighter than get_symbol_info)
+
+        Args:
+            symbol: Trading symbol
+
+        Returns:
+            Dict with bid/ask or None if failed
+        """
+        if not self.connected:
+            self.logger.error("Not connected to MT5")
+            return None
+
+        tick = mt5.symbol_info_tick(symbol)
+        if tick is None:
+            self.logger.error("No tick data for %s", symbol)
+            return None
+
+        return {
+            'bid': tick.bid,
+            'ask': tick.ask,
+            'time': tick.time
+        }
+
     def _get_filling_mode(self, symbol: str) -> int:
         """Get the appropriate filling mode for a symbol"""
         symbol_info = mt5.symbol_info(symbol)
@@ -177,7 +202,7 @@ class MT5Connector:
         else:
             return mt5.ORDER_FILLING_RETURN
 
-    def get_positions(self, symbol: Optional[str] = None) -> List[Dict]:
+    def get_positions(self, symbol: Optional[str] = None) -> Optional[List[Dict]]:
         """
         Get open positions
 
@@ -185,11 +210,11 @@ class MT5Connector:
             symbol: Filter by symbol (optional)
 
         Returns:
-            List of position dictionaries
+            List of position dictionaries (empty if none are open), or None if the fetch failed
         """
         if not self.connected:
             self.logger.error("Not connected to MT5")
-            return []
+            return None
 
         if symbol:
             positions = mt5.positions_get(symbol=symbol)
@@ -197,7 +222,8 @@ class MT5Connector:
             positions = mt5.positions_get()
 
         if positions is None:
-            return []
+            self.logger.error("Failed to get positions: %s", mt5.last_error())
+            return None
 
         return [
             {
@@ -240,12 +266,12 @@ class MT5Connector:
 
         symbol_info = mt5.symbol_info(symbol)
         if symbol_info is None:
-            self.logger.error(f"Symbol {symbol} not found")
+            self.logger.error("Symbol %s not found", symbol)
             return None
 
         if not symbol_info.visible:
             if not mt5.symbol_select(symbol, True):
-                self.logger.error(f"Failed to select {symbol}")
+                self.logger.error("Failed to select %s", symbol)
                 return None
 
         # Determine order type
@@ -256,7 +282,7 @@ class MT5Connector:
             trade_type = mt5.ORDER_TYPE_SELL
             price = price or mt5.symbol_info_tick(symbol).bid
         else:
-            self.logger.error(f"Invalid order type: {order_type}")
+            self.logger.error("Invalid order type: %s", order_type)
             return None
 
         # Prepare request
@@ -278,14 +304,14 @@ class MT5Connector:
         result = mt5.order_send(request)
 
         if result is None:
-            self.logger.error(f"Order failed: {mt5.last_error()}")
+            self.logger.error("Order failed: %s", mt5.last_error())
             return None
 
         if result.retcode != mt5.TRADE_RETCODE_DONE:
-            self.logger.error(f"Order failed: {result.comment}")
+            self.logger.error("Order failed: %s", result.comment)
             return None
 
-        self.logger.info(f"Order successful: {order_type} {volume} {symbol} at {price}")
+        self.logger.info("Order successful: %s %s %s at %s", order_type, volume, symbol, price)
 
         return {
             'ticket': result.order,
@@ -312,7 +338,7 @@ class MT5Connector:
 
         positions = mt5.positions_get(ticket=ticket)
         if positions is None or len(positions) == 0:
-            self.logger.error(f"Position {ticket} not found")
+            self.logger.error("Position %s not found", ticket)
             return False
 
         position = positions[0]
@@ -341,10 +367,10 @@ class MT5Connector:
         result = mt5.order_send(request)
 
         if result.retcode != mt5.TRADE_RETCODE_DONE:
-            self.logger.error(f"Failed to close position {ticket}: {result.comment}")
+            self.logger.error("Failed to close position %s: %s", ticket, result.comment)
             return False
 
-        self.logger.info(f"Position {ticket} closed successfully")
+        self.logger.info("Position %s closed successfully", ticket)
         return True
 
     def modify_position(self, ticket: int, sl: float = 0.0, tp: float = 0.0) -> bool:
@@ -365,7 +391,7 @@ class MT5Connector:
 
         positions = mt5.positions_get(ticket=ticket)
         if positions is None or len(positions) == 0:
-            self.logger.error(f"Position {ticket} not found")
+            self.logger.error("Position %s not found", ticket)
             return False
 
         position = positions[0]
@@ -383,8 +409,8 @@ class MT5Connector:
         result = mt5.order_send(request)
 
         if result.retcode != mt5.TRADE_RETCODE_DONE:
-            self.logger.error(f"Failed to modify position {ticket}: {result.comment}")
+            self.logger.error("Failed to modify position %s: %s", ticket, result.comment)
             return False
 
-        self.logger.info(f"Position {ticket} modified successfully (SL: {sl}, TP: {tp})")
+        self.logger.info("Position %s modified successfully (SL: %s, TP: %s)", ticket, sl, tp)
         return True
@@ -18,13 +18,19 @@ Trailing Stop Strategy:
 """
 
 import asyncio
+import bisect
+import functools
 import logging
+import sys
 import time
 import yaml
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import NamedTuple, Optional
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
+    AIORateLimiter,
     Application,
     CommandHandler,
     MessageHandler,
@@ -37,6 +43,12 @@ from telegram.error import BadRequest
 from mt5_connector import MT5Connector
 from logger_config import setup_logging
 
+# libyaml-backed loader when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
 # Trailing Stop Configuration
 INITIAL_SL_DOLLARS = -35.0  # Initial stop loss at -$35
 
@@ -58,51 +70,191 @@ TRAILING_STOP_LEVELS = [
     (180.0, 160.0),  # At $180 PnL, lock $160 profit
     (200.0, 180.0),  # At $200 PnL, lock $180 profit
 ]
+TRAILING_STOP_TRIGGERS = [trigger_pnl for trigger_pnl, _ in TRAILING_STOP_LEVELS]  # ascending
+
+# Trade commands: message -> (order_type, is_bx_mode)
+TRADE_COMMANDS = {
+    'b': ('BUY', False),
+    's': ('SELL', False),
+    'bx': ('BUY', True),
+    'sx': ('SELL', True),
+}
+
+# Positions are re-fetched from MT5 at most this often (seconds)
+POSITIONS_CACHE_TTL = 0.25
+
+# Telegram allows 20 messages per minute into a group; live edits there are spaced
+# this far apart (seconds, per chat) to leave half of that for replies
+GROUP_LIVE_EDIT_INTERVAL = 6.0
 
 # Position limits
 MAX_SAME_DIRECTION = 3    # Max 3 positions in same direction
 MAX_TOTAL_POSITIONS = 5   # Max 5 total positions
 
 
+# P/L display
+PROFIT_EMOJI = "🟢"
+LOSS_EMOJI = "🔴"
+
+
+def format_pnl(pnl: float) -> tuple[str, str]:
+    """Format a dollar P/L as (emoji, signed string), e.g. ("🔴", "-$3.50")"""
+    if pnl >= 0:
+        return PROFIT_EMOJI, f"+${pnl:.2f}"
+    return LOSS_EMOJI, f"-${-pnl:.2f}"
+
+
+@dataclass(slots=True)
+class TrailingStopState:
+    """Trailing stop progress for one monitored position"""
+    current_level: int = -1  # highest triggered TRAILING_STOP_LEVELS index (-1 = initial SL)
+    added_at: float = field(default_factory=time.monotonic)
+
+
+class PositionsSnapshot(NamedTuple):
+    """Bot positions plus the aggregates every handler needs, computed once per fetch"""
+    positions: list         # position dicts from MT5Connector.get_positions
+    by_ticket: dict         # {ticket: position}
+    total_pnl: float
+    direction_counts: dict  # {'BUY': n, 'SELL': n}
+    fingerprint: tuple      # ((ticket, profit rounded to cents), ...) as rendered in menus
+    taken_at: float         # monotonic time the MT5 fetch started
+    fetched: bool           # False if the MT5 fetch failed (positions is then empty, not "none open")
+
+    @classmethod
+    def build(cls, positions: list, taken_at: float, fetched: bool = True) -> 'PositionsSnapshot':
+        total_pnl = 0.0
+        direction_counts = {'BUY': 0, 'SELL': 0}
+        for pos in positions:
+            total_pnl += pos['profit']
+            direction_counts[pos['type']] += 1
+
+        return cls(
+            positions=positions,
+            by_ticket={p['ticket']: p for p in positions},
+            total_pnl=total_pnl,
+            direction_counts=direction_counts,
+            fingerprint=tuple((p['ticket'], round(p['profit'], 2)) for p in positions),
+            taken_at=taken_at,
+            fetched=fetched,
+        )
+
+
 class TelegramTradingBot:
     """Telegram bot that listens for trade commands"""
 
     def __init__(self, config_file: str = 'config.yaml'):
         # Load configuration
         with open(config_file, 'r') as f:
-            self.config = yaml.safe_load(f)
+            self.config = yaml.load(f, Loader=YamlLoader)
 
         # Setup logging
         setup_logging(self.config['logging'])
         self.logger = logging.getLogger(__name__)
 
         # MT5 settings
-        self.symbol = self.config['trading']['symbol']
-        self.magic_number = self.config['trading']['magic_number']
+        self._mt5_config = self.config.get('mt5', {})
+        trading_config = self.config['trading']
+        self.symbol = trading_config['symbol']
+        self.magic_number = trading_config['magic_number']
+        self.lot_size = trading_config.get('lot_size', 0.1)
 
         # Telegram settings
         telegram_config = self.config.get('telegram', {})
         self.bot_token = telegram_config.get('bot_token', '')
-        self.allowed_chat_ids = telegram_config.get('allowed_chat_ids', [])
+        self.allowed_chat_ids = frozenset(telegram_config.get('allowed_chat_ids') or [])
 
         # Initialize components
         self.connector: Optional[MT5Connector] = None
         self.application: Optional[Application] = None
         self.running = False
 
+        # Set once connect_mt5 succeeds; jobs check this instead of the connector
+        self._mt5_ready = False
+        self._symbol_info_cached: Optional[dict] = None
+
+        # MT5 terminal API is not thread-safe: all blocking calls go through
+        # a single worker thread so they queue up off the event loop
+        self._mt5_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mt5')
+
         # Track live position displays for real-time updates
-        # {(chat_id, message_id): {'type': 'positions'|'close', 'last_update': timestamp}}
+        # {(chat_id, message_id): {'type': 'positions'|'close', 'last_update': monotonic timestamp,
+        #                          'text': positions text last sent, 'fingerprint': close menu contents last sent}}
         self.live_displays = {}
+        self._refresh_lock = asyncio.Lock()
+        # {group chat_id: monotonic time of the last live edit}, see GROUP_LIVE_EDIT_INTERVAL
+        self._group_edit_at: dict[int, float] = {}
+
+        # Trailing stop job handle (None while paused) and its overlap guard
+        self._trailing_job = None
+        self._trail_lock = asyncio.Lock()
+
+        # Optional sampling of trailing pass timings (profiling.enabled in config.yaml)
+        profiling_config = self.config.get('profiling') or {}
+        self._profile_enabled = bool(profiling_config.get('enabled', False))
+        self._profile_every = max(1, int(profiling_config.get('every_n', 1000)))
+        self._trail_ticks = 0
+
+        # Serializes position-limit checks with the order they gate
+        self._order_lock = asyncio.Lock()
 
         # Track positions for trailing stop monitoring
-        # {ticket: {'current_level': int}}  # current_level = highest triggered level index (-1 = initial SL)
-        self.monitored_positions = {}
+        # {ticket: TrailingStopState}
+        self.monitored_positions: dict[int, TrailingStopState] = {}
+
+        # Cached bot positions: (monotonic timestamp, PositionsSnapshot), see _get_positions_snapshot
+        self._positions_cache = (0.0, None)
+
+        # Command dispatch tables
+        self._text_commands = {
+            'c': self._show_close_menu,
+        }
+        self._callback_handlers = {
+            'status': self._send_status,
+            'positions': self._send_positions,
+            'close_all': self._close_all_positions,
+            'cancel': self._handle_cancel,
+        }
+        self._max_command_len = max(len(cmd) for cmd in (*self._text_commands, *TRADE_COMMANDS))
+
+        # Static buttons appended below the per-position rows of the close menu
+        self._close_menu_footer = [
+            [InlineKeyboardButton("❌ Close All", callback_data="close_all")],
+            [InlineKeyboardButton("🔙 Cancel", callback_data="cancel")],
+        ]
+
+        # /start reply is static, build it once
+        self._start_markup = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("📈 Status", callback_data="status"),
+                InlineKeyboardButton("📊 Positions", callback_data="positions"),
+            ],
+            [
+                InlineKeyboardButton("❌ Close All", callback_data="close_all"),
+            ],
+        ])
+        self._start_text = (
+            "🤖 *MT5 Trading Bot*\n\n"
+            "Commands:\n"
+            "`b` - BUY with trailing stop\n"
+            "`s` - SELL with trailing stop\n"
+            "`bx` - BUY TP $10, SL -$10\n"
+            "`sx` - SELL TP $10, SL -$10\n"
+            "`c` - Close menu\n\n"
+            "Trailing Stop:\n"
+            "• Initial SL: -$35\n"
+            "• At $20 → SL $5\n"
+            "• At $40 → SL $20\n"
+            "• At $60 → SL $40\n"
+            "• ...and so on\n\n"
+            "Or use the buttons below:"
+        )
 
         self.logger.info("Telegram Trading Bot initialized")
 
     def connect_mt5(self) -> bool:
         """Connect to MT5"""
-        mt5_config = self.config.get('mt5', {})
+        mt5_config = self._mt5_config
         login = mt5_config.get('login', 0)
         password = mt5_config.get('password', '')
         server = mt5_config.get('server', '')
@@ -117,9 +269,29 @@ class TelegramTradingBot:
             self.logger.error("Failed to connect to MT5")
             return False
 
-        self.logger.info(f"Connected to MT5, trading {self.symbol}")
+        # Prefetch symbol metadata so the trailing stop job never waits on it
+        self._symbol_info_cached = self.connector.get_symbol_info(self.symbol)
+        self._mt5_ready = True
+
+        self.logger.info("Connected to MT5, trading %s", self.symbol)
         return True
 
+    async def refresh_symbol_info(self, context: ContextTypes.DEFAULT_TYPE):
+        """Refresh cached symbol metadata (runs as job)"""
+        if not self._mt5_ready:
+            return
+
+        symbol_info = await self._call_mt5(self.connector.get_symbol_info, self.symbol)
+        if symbol_info:
+            self._symbol_info_cached = symbol_info
+
+    async def _call_mt5(self, func, *args, **kwargs):
+        """Run a blocking MT5 connector call on the MT5 worker thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._mt5_executor, functools.partial(func, *args, **kwargs)
+        )
+
     def is_allowed_chat(self, chat_id: int) -> bool:
         """Check if chat is allowed to send commands"""
         if not self.allowed_chat_ids:
@@ -131,64 +303,65 @@ class TelegramTradingBot:
         if not self.is_allowed_chat(update.effective_chat.id):
             return
 
-        keyboard = [
-            [
-                InlineKeyboardButton("📈 Status", callback_data="status"),
-                InlineKeyboardButton("📊 Positions", callback_data="positions"),
-            ],
-            [
-                InlineKeyboardButton("❌ Close All", callback_data="close_all"),
-            ],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
         await update.message.reply_text(
-            "🤖 *MT5 Trading Bot*\n\n"
-            "Commands:\n"
-            "`b` - BUY with trailing stop\n"
-            "`s` - SELL with trailing stop\n"
-            "`bx` - BUY TP $10, SL -$10\n"
-            "`sx` - SELL TP $10, SL -$10\n"
-            "`c` - Close menu\n\n"
-            "Trailing Stop:\n"
-            "• Initial SL: -$35\n"
-            "• At $20 → SL $5\n"
-            "• At $40 → SL $20\n"
-            "• At $60 → SL $40\n"
-            "• ...and so on\n\n"
-            "Or use the buttons below:",
-            reply_markup=reply_markup,
+            self._start_text,
+            reply_markup=self._start_markup,
             parse_mode='Markdown'
         )
 
-    def _build_close_menu_keyboard(self):
-        """Build close menu keyboard with current positions"""
-        positions = self.connector.get_positions(symbol=self.symbol)
-        positions = [p for p in positions if p['magic'] == self.magic_number]
+    def _get_positions_snapshot(self) -> PositionsSnapshot:
+        """Get open positions for this bot's symbol and magic number (short-lived cache)"""
+        cached_at, snapshot = self._positions_cache
+        if snapshot is not None and time.monotonic() - cached_at < POSITIONS_CACHE_TTL:
+            return snapshot
 
+        taken_at = time.monotonic()
+        positions = self.connector.get_positions(symbol=self.symbol)
+        if positions is None:
+            # Not cached, so the next read retries right away
+            return PositionsSnapshot.build([], taken_at, fetched=False)
+
+        snapshot = PositionsSnapshot.build([p for p in positions if p['magic'] == self.magic_number], taken_at)
+        self._positions_cache = (time.monotonic(), snapshot)
+        return snapshot
+
+    async def _positions(self) -> PositionsSnapshot:
+        """Get this bot's open positions without blocking the event loop"""
+        return await self._call_mt5(self._get_positions_snapshot)
+
+    def _invalidate_positions(self):
+        """Drop cached positions after an order or close"""
+        self._positions_cache = (0.0, None)
+
+    def _mutate_positions(self, func, *args, **kwargs):
+        """Run a position-changing connector call and drop the cache in the same MT5 worker job"""
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # Reads queued behind this call must not see the pre-mutation snapshot
+            self._invalidate_positions()
+
+    def _build_close_menu_keyboard(self, snapshot: PositionsSnapshot):
+        """Build close menu keyboard with current positions"""
+        positions = snapshot.positions
         if not positions:
             return None, None
 
-        total_pnl = sum(p['profit'] for p in positions)
-        total_emoji = "🟢" if total_pnl >= 0 else "🔴"
-        total_str = f"+${total_pnl:.2f}" if total_pnl >= 0 else f"-${abs(total_pnl):.2f}"
-
         keyboard = []
         for pos in positions:
-            emoji = "🟢" if pos['profit'] >= 0 else "🔴"
-            pnl = f"+${pos['profit']:.2f}" if pos['profit'] >= 0 else f"-${abs(pos['profit']):.2f}"
+            emoji, pnl = format_pnl(pos['profit'])
             label = f"{emoji} {pos['type']} {pos['volume']} | {pnl}"
             keyboard.append([InlineKeyboardButton(label, callback_data=f"close_{pos['ticket']}")])
+        keyboard.extend(self._close_menu_footer)
 
-        keyboard.append([InlineKeyboardButton("❌ Close All", callback_data="close_all")])
-        keyboard.append([InlineKeyboardButton("🔙 Cancel", callback_data="cancel")])
-
+        total_emoji, total_str = format_pnl(snapshot.total_pnl)
         text = f"Select position to close: | {total_emoji} {total_str}"
         return text, InlineKeyboardMarkup(keyboard)
 
     async def _show_close_menu(self, update: Update):
         """Show positions as buttons to close"""
-        text, keyboard = self._build_close_menu_keyboard()
+        snapshot = await self._positions()
+        text, keyboard = self._build_close_menu_keyboard(snapshot)
 
         if not keyboard:
             await update.message.reply_text("📈 No open positions to close")
@@ -199,7 +372,8 @@ class TelegramTradingBot:
         # Track for live updates
         self.live_displays[(msg.chat_id, msg.message_id)] = {
             'type': 'close',
-            'last_update': time.time()
+            'last_update': time.monotonic(),
+            'fingerprint': snapshot.fingerprint
         }
 
     def check_position_limits(self, order_type: str) -> tuple[bool, str]:
@@ -209,11 +383,10 @@ class TelegramTradingBot:
         Returns:
             (can_open, reason)
         """
-        positions = self.connector.get_positions(symbol=self.symbol)
-        positions = [p for p in positions if p['magic'] == self.magic_number]
+        snapshot = self._get_positions_snapshot()
 
-        total_positions = len(positions)
-        same_direction = sum(1 for p in positions if p['type'] == order_type)
+        total_positions = len(snapshot.positions)
+        same_direction = snapshot.direction_counts.get(order_type, 0)
 
         # Check total limit
         if total_positions >= MAX_TOTAL_POSITIONS:
@@ -230,47 +403,95 @@ class TelegramTradingBot:
         if not self.is_allowed_chat(update.effective_chat.id):
             return
 
-        message = update.message.text.strip().lower()
-        self.logger.debug(f"Received message: {message}")
+        text = update.message.text
+        self.logger.debug("Received message: %s", text)
+
+        # Commands are short tokens; drop ordinary chat before normalizing it
+        if len(text) > self._max_command_len and len(text.strip()) > self._max_command_len:
+            return
+
+        message = text.strip().lower()
 
         # Parse commands
-        if message == 'c':
-            await self._show_close_menu(update)
+        handler = self._text_commands.get(message)
+        if handler:
+            await handler(update)
             return
 
-        if message not in ('b', 's', 'bx', 'sx'):
+        trade_command = TRADE_COMMANDS.get(message)
+        if trade_command is None:
             return
 
         # Determine order type and mode
-        order_type = 'BUY' if message in ('b', 'bx') else 'SELL'
-        is_bx_mode = message in ('bx', 'sx')
-        lot_size = self.config['trading'].get('lot_size', 0.1)
-        self.logger.info(f"Trade command received: {order_type} {lot_size} (bx_mode={is_bx_mode})")
+        order_type, is_bx_mode = trade_command
+        lot_size = self.lot_size
+        self.logger.info("Trade command received: %s %s (bx_mode=%s)", order_type, lot_size, is_bx_mode)
+
+        # Limit check and order are one step so concurrent commands can't both pass the check
+        async with self._order_lock:
+            # Check position limits
+            can_open, reason = await self._call_mt5(self.check_position_limits, order_type)
+            if can_open:
+                result = None
+                if is_bx_mode:
+                    # bx/sx mode: fixed TP $10 and SL -$10
+                    prices = await self._call_mt5(
+                        self._calculate_prices_for_profit, order_type, lot_size, BX_TP_DOLLARS, BX_SL_DOLLARS
+                    )
+                    if prices is not None:
+                        tp_price, sl_price = prices
+                        result = await self._call_mt5(
+                            self._mutate_positions,
+                            self.connector.send_order,
+                            symbol=self.symbol,
+                            order_type=order_type,
+                            volume=lot_size,
+                            sl=sl_price,
+                            tp=tp_price,
+                            magic=self.magic_number,
+                            comment=f"TG_{order_type}_BX"
+                        )
+                else:
+                    # b/s mode: trailing stop
+                    prices = await self._call_mt5(
+                        self._calculate_prices_for_profit, order_type, lot_size, INITIAL_SL_DOLLARS
+                    )
+                    if prices is not None:
+                        sl_price, = prices
+                        result = await self._call_mt5(
+                            self._mutate_positions,
+                            self.connector.send_order,
+                            symbol=self.symbol,
+                            order_type=order_type,
+                            volume=lot_size,
+                            sl=sl_price,
+                            magic=self.magic_number,
+                            comment=f"TG_{order_type}"
+                        )
+                if result:
+                    # Track for trailing stop monitoring (start at level -1 = initial SL)
+                    # before (re)starting the job, so the job never sees an empty tracker
+                    self.monitored_positions[result['ticket']] = TrailingStopState()
+                    self._start_trailing_job()
 
-        # Check position limits
-        can_open, reason = self.check_position_limits(order_type)
+        # Reply after releasing the lock so a slow Telegram call doesn't hold up other trade commands
         if not can_open:
-            self.logger.warning(f"Position limit reached: {reason}")
+            self.logger.warning("Position limit reached: %s", reason)
             await update.message.reply_text(f"⚠️ {reason}")
             return
 
-        if is_bx_mode:
-            # bx/sx mode: fixed TP $10 and SL -$10
-            tp_price = self._calculate_price_for_profit(order_type, lot_size, BX_TP_DOLLARS)
-            sl_price = self._calculate_price_for_profit(order_type, lot_size, BX_SL_DOLLARS)
-
-            result = self.connector.send_order(
-                symbol=self.symbol,
-                order_type=order_type,
-                volume=lot_size,
-                sl=sl_price,
-                tp=tp_price,
-                magic=self.magic_number,
-                comment=f"TG_{order_type}_BX"
-            )
+        if prices is None:
+            # No SL could be priced, never open an unprotected position
+            self.logger.error("Order not sent: no symbol info or tick for %s", self.symbol)
+            await update.message.reply_text(f"❌ {order_type} not sent: no price data for {self.symbol}")
+            return
 
+        if is_bx_mode:
             if result:
-                self.logger.info(f"Order executed: {order_type} {lot_size} @ {result['price']} TP: {tp_price:.2f} ($10) SL: {sl_price:.2f} (-$10)")
+                self.logger.info(
+                    "Order executed: %s %s @ %s TP: %.2f ($10) SL: %.2f (-$10)",
+                    order_type, lot_size, result['price'], tp_price, sl_price
+                )
                 await update.message.reply_text(
                     f"✅ *{order_type}* {lot_size} lots @ {result['price']:.2f}\n"
                     f"TP: {tp_price:.2f} ($10)\n"
@@ -278,26 +499,13 @@ class TelegramTradingBot:
                     f"Ticket: `{result['ticket']}`",
                     parse_mode='Markdown'
                 )
+                await self._refresh_after_mutation()
             else:
-                self.logger.error(f"Failed to execute {order_type} {lot_size}")
+                self.logger.error("Failed to execute %s %s", order_type, lot_size)
                 await update.message.reply_text(f"❌ Failed to execute {order_type} {lot_size}")
         else:
-            # b/s mode: trailing stop
-            sl_price = self._calculate_price_for_profit(order_type, lot_size, INITIAL_SL_DOLLARS)
-
-            result = self.connector.send_order(
-                symbol=self.symbol,
-                order_type=order_type,
-                volume=lot_size,
-                sl=sl_price,
-                magic=self.magic_number,
-                comment=f"TG_{order_type}"
-            )
-
             if result:
-                # Track for trailing stop monitoring (start at level -1 = initial SL)
-                self.monitored_positions[result['ticket']] = {'current_level': -1}
-                self.logger.info(f"Order executed: {order_type} {lot_size} @ {result['price']} SL: {sl_price:.2f} (-$35)")
+                self.logger.info("Order executed: %s %s @ %s SL: %.2f (-$35)", order_type, lot_size, result['price'], sl_price)
                 await update.message.reply_text(
                     f"✅ *{order_type}* {lot_size} lots @ {result['price']:.2f}\n"
                     f"SL: {sl_price:.2f} (-$35)\n"
@@ -305,8 +513,9 @@ class TelegramTradingBot:
                     f"Ticket: `{result['ticket']}`",
                     parse_mode='Markdown'
                 )
+                await self._refresh_after_mutation()
             else:
-                self.logger.error(f"Failed to execute {order_type} {lot_size}")
+                self.logger.error("Failed to execute %s %s", order_type, lot_size)
                 await update.message.reply_text(f"❌ Failed to execute {order_type} {lot_size}")
 
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -317,25 +526,24 @@ class TelegramTradingBot:
         if not self.is_allowed_chat(update.effective_chat.id):
             return
 
-        if query.data == "status":
-            await self._send_status(query)
-        elif query.data == "positions":
-            await self._send_positions(query)
-        elif query.data == "close_all":
-            await self._close_all_positions(query)
-        elif query.data == "cancel":
-            # Remove from live tracking
-            key = (query.message.chat_id, query.message.message_id)
-            if key in self.live_displays:
-                del self.live_displays[key]
-            await query.edit_message_text("Cancelled")
+        handler = self._callback_handlers.get(query.data)
+        if handler:
+            await handler(query)
         elif query.data.startswith("close_"):
-            ticket = int(query.data.replace("close_", ""))
+            ticket = int(query.data.removeprefix("close_"))
             await self._close_single_position(query, ticket)
 
+    async def _handle_cancel(self, query):
+        """Dismiss a menu"""
+        # Remove from live tracking
+        key = (query.message.chat_id, query.message.message_id)
+        if key in self.live_displays:
+            del self.live_displays[key]
+        await query.edit_message_text("Cancelled")
+
     async def _send_status(self, query):
         """Send account status"""
-        account_info = self.connector.get_account_info()
+        account_info = await self._call_mt5(self.connector.get_account_info)
         if account_info:
             text = (
                 f"📊 *Account Status*\n\n"
@@ -349,33 +557,27 @@ class TelegramTradingBot:
 
         await query.edit_message_text(text, parse_mode='Markdown')
 
-    def _build_positions_text(self):
+    def _build_positions_text(self, snapshot: PositionsSnapshot):
         """Build positions text"""
-        positions = self.connector.get_positions(symbol=self.symbol)
-        positions = [p for p in positions if p['magic'] == self.magic_number]
-
+        positions = snapshot.positions
         if not positions:
             return "📈 No open positions", False
 
-        total_pnl = sum(p['profit'] for p in positions)
-        total_emoji = "🟢" if total_pnl >= 0 else "🔴"
-        total_str = f"+${total_pnl:.2f}" if total_pnl >= 0 else f"-${abs(total_pnl):.2f}"
-
-        text = f"📈 *Open Positions* | {total_emoji} {total_str}\n\n"
+        total_emoji, total_str = format_pnl(snapshot.total_pnl)
+        parts = [f"📈 *Open Positions* | {total_emoji} {total_str}\n\n"]
         for pos in positions:
-            emoji = "🟢" if pos['profit'] >= 0 else "🔴"
-            pnl_str = f"+${pos['profit']:.2f}" if pos['profit'] >= 0 else f"-${abs(pos['profit']):.2f}"
+            emoji, pnl_str = format_pnl(pos['profit'])
             sl_str = f"{pos['sl']:.2f}" if pos['sl'] > 0 else "None"
-            text += (
+            parts.append(
                 f"{emoji} {pos['type']} {pos['volume']} @ {pos['price_open']:.2f}\n"
                 f"   P/L: `{pnl_str}` | SL: {sl_str}\n\n"
             )
 
-        return text, True
+        return "".join(parts), True
 
     async def _send_positions(self, query):
         """Send open positions"""
-        text, has_positions = self._build_positions_text()
+        text, has_positions = self._build_positions_text(await self._positions())
 
         await query.edit_message_text(text, parse_mode='Markdown')
 
@@ -385,27 +587,34 @@ class TelegramTradingBot:
             message_id = query.message.message_id
             self.live_displays[(chat_id, message_id)] = {
                 'type': 'positions',
-                'last_update': time.time()
+                'last_update': time.monotonic(),
+                'text': text
             }
 
     async def _close_all_positions(self, query):
         """Close all positions"""
-        positions = self.connector.get_positions(symbol=self.symbol)
-        positions = [p for p in positions if p['magic'] == self.magic_number]
+        positions = (await self._positions()).positions
 
         if not positions:
             await query.edit_message_text("📈 No positions to close")
             return
 
+        # Queue all closes at once; replies are sent after the batch completes
+        results = await asyncio.gather(
+            *[self._call_mt5(self._mutate_positions, self.connector.close_position, pos['ticket']) for pos in positions],
+            return_exceptions=True
+        )
+
         closed = 0
         total_pnl = 0.0
-        for pos in positions:
-            if self.connector.close_position(pos['ticket']):
+        for pos, result in zip(positions, results):
+            if isinstance(result, Exception):
+                self.logger.error("Error closing position %s: %s", pos['ticket'], result)
+            elif result:
                 closed += 1
                 total_pnl += pos['profit']
 
-        emoji = "🟢" if total_pnl >= 0 else "🔴"
-        pnl_str = f"+${total_pnl:.2f}" if total_pnl >= 0 else f"-${abs(total_pnl):.2f}"
+        emoji, pnl_str = format_pnl(total_pnl)
 
         # Remove from live tracking
         key = (query.message.chat_id, query.message.message_id)
@@ -413,20 +622,22 @@ class TelegramTradingBot:
             del self.live_displays[key]
 
         await query.edit_message_text(f"✅ Closed {closed}/{len(positions)} positions\n{emoji} Total P/L: {pnl_str}")
+        await self._refresh_after_mutation()
 
     async def _close_single_position(self, query, ticket: int):
         """Close a single position by ticket"""
-        positions = self.connector.get_positions(symbol=self.symbol)
-        position = next((p for p in positions if p['ticket'] == ticket), None)
+        # The fetch supplies the P/L for the reply (close_position only returns a bool)
+        # and is served from the cache within POSITIONS_CACHE_TTL
+        position = (await self._positions()).by_ticket.get(ticket)
 
         if not position:
             await query.edit_message_text(f"❌ Position {ticket} not found")
             return
 
         profit = position['profit']
-        if self.connector.close_position(ticket):
-            emoji = "🟢" if profit >= 0 else "🔴"
-            pnl_str = f"+${profit:.2f}" if profit >= 0 else f"-${abs(profit):.2f}"
+        closed = await self._call_mt5(self._mutate_positions, self.connector.close_position, ticket)
+        if closed:
+            emoji, pnl_str = format_pnl(profit)
 
             # Remove from live tracking
             key = (query.message.chat_id, query.message.message_id)
@@ -437,91 +648,122 @@ class TelegramTradingBot:
                 f"✅ Closed {position['type']} {position['volume']} lots\n"
                 f"{emoji} P/L: {pnl_str}"
             )
+            await self._refresh_after_mutation()
         else:
             await query.edit_message_text(f"❌ Failed to close position {ticket}")
 
     async def update_live_displays(self, context: ContextTypes.DEFAULT_TYPE):
         """Update all live position displays (runs as job)"""
-        if not self.connector or not self.connector.connected:
+        # Skip this tick if an eager refresh is already in flight
+        if self._refresh_lock.locked():
             return
 
-        if not self.live_displays:
+        await self._refresh_all_live_displays(context.bot)
+
+    async def _refresh_all_live_displays(self, bot):
+        """Re-render every tracked live display with current positions"""
+        if not self._mt5_ready:
             return
 
-        # Remove stale displays (older than 5 minutes)
-        stale_keys = [
-            key for key, data in self.live_displays.items()
-            if time.time() - data['last_update'] > 300
-        ]
-        for key in stale_keys:
-            del self.live_displays[key]
+        if not self.live_displays:
+            return
 
-        # Update each tracked display
-        for (chat_id, message_id), data in list(self.live_displays.items()):
-            try:
-                if data['type'] == 'positions':
-                    text, has_positions = self._build_positions_text()
-                    if not has_positions:
-                        # No more positions, remove tracking
-                        del self.live_displays[(chat_id, message_id)]
-                    await context.bot.edit_message_text(
-                        chat_id=chat_id,
-                        message_id=message_id,
-                        text=text,
-                        parse_mode='Markdown'
-                    )
-                elif data['type'] == 'close':
-                    text, keyboard = self._build_close_menu_keyboard()
-                    if not keyboard:
-                        # No more positions
-                        await context.bot.edit_message_text(
-                            chat_id=chat_id,
-                            message_id=message_id,
-                            text="📈 No open positions"
-                        )
-                        del self.live_displays[(chat_id, message_id)]
-                    else:
-                        await context.bot.edit_message_text(
+        async with self._refresh_lock:
+            now = time.monotonic()
+            snapshot = await self._positions()
+
+            # Prune stale displays (older than 5 minutes) and update the rest in one pass
+            for key in list(self.live_displays):
+                data = self.live_displays.get(key)
+                if data is None:
+                    continue
+                if now - data['last_update'] > 300:
+                    del self.live_displays[key]
+                    continue
+
+                chat_id, message_id = key
+                # Group chats (negative ids) share a 20/min budget with replies; a skipped
+                # edit is picked up by a later pass since its text/fingerprint is unchanged
+                if chat_id < 0 and now - self._group_edit_at.get(chat_id, 0.0) < GROUP_LIVE_EDIT_INTERVAL:
+                    continue
+
+                try:
+                    if data['type'] == 'positions':
+                        text, has_positions = self._build_positions_text(snapshot)
+                        if has_positions and text == data.get('text'):
+                            # Same text as last edit, Telegram would reject it as not modified
+                            continue
+                        if chat_id < 0:
+                            self._group_edit_at[chat_id] = now
+                        if not has_positions:
+                            # No more positions, remove tracking
+                            self.live_displays.pop((chat_id, message_id), None)
+                        await bot.edit_message_text(
                             chat_id=chat_id,
                             message_id=message_id,
                             text=text,
-                            reply_markup=keyboard
+                            parse_mode='Markdown'
                         )
-                data['last_update'] = time.time()
-            except BadRequest as e:
-                # Message not modified or deleted
-                if "not modified" not in str(e).lower():
-                    del self.live_displays[(chat_id, message_id)]
-            except Exception:
-                # Remove from tracking on any error
-                del self.live_displays[(chat_id, message_id)]
-
-    def _calculate_price_for_profit(self, order_type: str, lot_size: float, target_dollars: float) -> float:
-        """Calculate price level for target dollar profit from current price"""
-        symbol_info = self.connector.get_symbol_info(self.symbol)
-        if not symbol_info:
-            return 0.0
+                        data['text'] = text
+                    elif data['type'] == 'close':
+                        if snapshot.positions and snapshot.fingerprint == data.get('fingerprint'):
+                            # Nothing visible changed, skip rebuilding the keyboard
+                            continue
+
+                        if chat_id < 0:
+                            self._group_edit_at[chat_id] = now
+                        text, keyboard = self._build_close_menu_keyboard(snapshot)
+                        if not keyboard:
+                            # No more positions
+                            await bot.edit_message_text(
+                                chat_id=chat_id,
+                                message_id=message_id,
+                                text="📈 No open positions"
+                            )
+                            self.live_displays.pop((chat_id, message_id), None)
+                        else:
+                            await bot.edit_message_text(
+                                chat_id=chat_id,
+                                message_id=message_id,
+                                text=text,
+                                reply_markup=keyboard
+                            )
+                            data['fingerprint'] = snapshot.fingerprint
+                    data['last_update'] = now
+                except BadRequest as e:
+                    # Message not modified or deleted
+                    if "not modified" not in str(e).lower():
+                        self.live_displays.pop((chat_id, message_id), None)
+                except Exception:
+                    # Remove from tracking on any error
+                    self.live_displays.pop((chat_id, message_id), None)
+
+    async def _refresh_after_mutation(self):
+        """Push fresh state to live displays right after an order/close"""
+        if self.application is None:
+            return
+        await self._refresh_all_live_displays(self.application.bot)
+
+    def _calculate_prices_for_profit(self, order_type: str, lot_size: float, *target_dollars: float) -> Optional[tuple]:
+        """Calculate price levels for target dollar profits from current price (one tick fetch), None without price data"""
+        symbol_info = self._symbol_info_cached or self.connector.get_symbol_info(self.symbol)
+        tick = self.connector.get_symbol_tick(self.symbol)
+        if not symbol_info or not tick:
+            return None
 
         contract_size = symbol_info.get('trade_contract_size', 100)
-        current_price = symbol_info['ask'] if order_type == 'BUY' else symbol_info['bid']
+        current_price = tick['ask'] if order_type == 'BUY' else tick['bid']
 
-        # Price movement per dollar = 1 / (volume * contract_size)
+        # Price movement per dollar = 1 / (volume * contract_size), signed by direction
         price_per_dollar = 1.0 / (lot_size * contract_size)
-        price_distance = target_dollars * price_per_dollar
+        if order_type != 'BUY':
+            price_per_dollar = -price_per_dollar
 
-        if order_type == 'BUY':
-            return current_price + price_distance
-        else:
-            return current_price - price_distance
+        return tuple(current_price + dollars * price_per_dollar for dollars in target_dollars)
 
-    def _calculate_sl_price_for_profit(self, position: dict, target_profit: float) -> float:
+    @staticmethod
+    def _calculate_sl_price_for_profit(position: dict, target_profit: float, price_per_dollar: float) -> float:
         """Calculate stop loss price that locks in a specific dollar profit"""
-        symbol_info = self.connector.get_symbol_info(self.symbol)
-        if not symbol_info:
-            return 0.0
-
-        contract_size = symbol_info.get('trade_contract_size', 100)
-        price_per_dollar = 1.0 / (position['volume'] * contract_size)
         price_distance = target_profit * price_per_dollar
 
         if position['type'] == 'BUY':
@@ -531,49 +773,156 @@ class TelegramTradingBot:
             # For SELL, SL is below open price by profit distance
             return position['price_open'] - price_distance
 
-    async def monitor_trailing_stops(self, context: ContextTypes.DEFAULT_TYPE):
-        """Monitor positions and update trailing stop when PnL thresholds are crossed"""
-        if not self.connector or not self.connector.connected:
+    def _start_trailing_job(self):
+        """Schedule the trailing stop job unless it is already running"""
+        if self._trailing_job is not None or self.application is None:
             return
 
-        positions = self.connector.get_positions(symbol=self.symbol)
-        positions = [p for p in positions if p['magic'] == self.magic_number]
-        open_tickets = {p['ticket'] for p in positions}
+        self._trailing_job = self.application.job_queue.run_repeating(
+            self.monitor_trailing_stops,
+            interval=1.0,
+            first=1.0
+        )
 
-        # Clean up closed positions from tracking
-        closed_tickets = [t for t in self.monitored_positions if t not in open_tickets]
-        for ticket in closed_tickets:
-            del self.monitored_positions[ticket]
+    async def monitor_trailing_stops(self, context: ContextTypes.DEFAULT_TYPE):
+        """Monitor positions and update trailing stop when PnL thresholds are crossed (runs as job)"""
+        # A slow MT5 round-trip must not let ticks pile up behind it
+        if self._trail_lock.locked():
+            return
 
-        # Check each position
-        for position in positions:
+        async with self._trail_lock:
+            snapshot = await self._update_trailing_stops()
+
+            # Nothing left to trail: stop polling MT5 until the next order restarts the job.
+            # Only trust a fetch that succeeded (a failed one looks like "no positions"),
+            # and keep running while an order is in flight, its ticket isn't tracked yet
+            if (
+                snapshot is not None
+                and snapshot.fetched
+                and not self.monitored_positions
+                and not self._order_lock.locked()
+                and self._trailing_job is context.job
+            ):
+                context.job.schedule_removal()
+                self._trailing_job = None
+
+    async def _update_trailing_stops(self) -> Optional[PositionsSnapshot]:
+        """Move SLs for positions that crossed a new trailing level, return the snapshot used"""
+        if not self._mt5_ready:
+            return None
+
+        if not self._profile_enabled:
+            snapshot, _ = await self._trailing_pass()
+            return snapshot
+
+        marks = [time.perf_counter_ns()]
+        snapshot, pending = await self._trailing_pass(marks)
+        t0, t1, t2, t3 = marks
+
+        self._trail_ticks += 1
+        if self._trail_ticks % self._profile_every == 0:
+            self.logger.info(
+                "Trailing pass timings (us): fetch=%d scan=%d modify=%d positions=%d updates=%d",
+                (t1 - t0) // 1000, (t2 - t1) // 1000, (t3 - t2) // 1000,
+                len(snapshot.positions), len(pending)
+            )
+        return snapshot
+
+    async def _trailing_pass(self, marks: Optional[list] = None) -> tuple:
+        """Fetch, scan and modify once; with marks, append a perf_counter_ns() stamp after each phase"""
+        snapshot = await self._positions()
+        if marks is not None:
+            marks.append(time.perf_counter_ns())
+        pending = await self._find_trailing_updates(snapshot)
+        if marks is not None:
+            marks.append(time.perf_counter_ns())
+        if pending:
+            await self._apply_trailing_updates(pending)
+        if marks is not None:
+            marks.append(time.perf_counter_ns())
+        return snapshot, pending
+
+    async def _find_trailing_updates(self, snapshot: PositionsSnapshot) -> list:
+        """Sync tracking with open positions and return (position, new_level, sl_price) for each SL to move"""
+        if not snapshot.fetched:
+            # A failed fetch says nothing about which positions closed, keep tracking as is
+            return []
+
+        # Clean up closed positions from tracking; tickets added after the snapshot
+        # was fetched are new orders it couldn't see yet, not closed positions
+        for ticket in self.monitored_positions.keys() - snapshot.by_ticket.keys():
+            if self.monitored_positions[ticket].added_at < snapshot.taken_at:
+                del self.monitored_positions[ticket]
+
+        # Find positions that crossed a new level
+        crossed = []
+        for position in snapshot.positions:
             ticket = position['ticket']
 
             # Auto-track untracked positions (in case bot restarted)
             if ticket not in self.monitored_positions:
-                self.monitored_positions[ticket] = {'current_level': -1}
+                self.monitored_positions[ticket] = TrailingStopState()
 
-            tracking = self.monitored_positions[ticket]
-            current_level = tracking['current_level']
+            current_level = self.monitored_positions[ticket].current_level
             current_pnl = position['profit']
 
-            # Find the highest level triggered by current PnL
-            new_level = current_level
-            for i, (trigger_pnl, _) in enumerate(TRAILING_STOP_LEVELS):
-                if current_pnl >= trigger_pnl and i > current_level:
-                    new_level = i
+            # Find the highest level triggered by current PnL (levels never move back down)
+            new_level = max(current_level, bisect.bisect_right(TRAILING_STOP_TRIGGERS, current_pnl) - 1)
 
-            # If we've crossed a new level, update the SL
             if new_level > current_level:
-                _, sl_lock_profit = TRAILING_STOP_LEVELS[new_level]
-                sl_price = self._calculate_sl_price_for_profit(position, sl_lock_profit)
-
-                if self.connector.modify_position(ticket, sl=sl_price):
-                    tracking['current_level'] = new_level
-                    trigger_pnl, _ = TRAILING_STOP_LEVELS[new_level]
-                    self.logger.info(
-                        f"Trailing SL: ticket {ticket}, PnL ${current_pnl:.2f} hit ${trigger_pnl} → SL @ {sl_price:.2f} (${sl_lock_profit})"
-                    )
+                crossed.append((position, new_level))
+
+        if not crossed:
+            return []
+
+        # Contract size is fixed per symbol, use the prefetched metadata
+        symbol_info = self._symbol_info_cached
+        if not symbol_info:
+            symbol_info = await self._call_mt5(self.connector.get_symbol_info, self.symbol)
+            if not symbol_info:
+                self.logger.error("Cannot update trailing SL: no symbol info for %s", self.symbol)
+                return []
+            self._symbol_info_cached = symbol_info
+        contract_size = symbol_info.get('trade_contract_size', 100)
+
+        pending = []
+        for position, new_level in crossed:
+            # Price movement per dollar = 1 / (volume * contract_size); volume is read live
+            # since a partial close keeps the ticket but shrinks it
+            price_per_dollar = 1.0 / (position['volume'] * contract_size)
+            _, sl_lock_profit = TRAILING_STOP_LEVELS[new_level]
+            sl_price = self._calculate_sl_price_for_profit(position, sl_lock_profit, price_per_dollar)
+            pending.append((position, new_level, sl_price))
+
+        return pending
+
+    async def _apply_trailing_updates(self, pending: list):
+        """Send the SL moves found by _find_trailing_updates and record the new levels"""
+        # Queue all SL updates at once
+        results = await asyncio.gather(
+            *[
+                self._call_mt5(self._mutate_positions, self.connector.modify_position, position['ticket'], sl=sl_price)
+                for position, _, sl_price in pending
+            ],
+            return_exceptions=True
+        )
+
+        for (position, new_level, sl_price), result in zip(pending, results):
+            ticket = position['ticket']
+            if isinstance(result, Exception):
+                self.logger.error("Error updating trailing SL for %s: %s", ticket, result)
+                continue
+
+            tracking = self.monitored_positions.get(ticket)
+            if not result or tracking is None:
+                continue
+
+            tracking.current_level = new_level
+            trigger_pnl, sl_lock_profit = TRAILING_STOP_LEVELS[new_level]
+            self.logger.info(
+                "Trailing SL: ticket %s, PnL $%.2f hit $%s → SL @ %.2f ($%s)",
+                ticket, position['profit'], trigger_pnl, sl_price, sl_lock_profit
+            )
 
     def run(self):
         """Start the bot"""
@@ -584,16 +933,35 @@ class TelegramTradingBot:
         if not self.connect_mt5():
             return
 
-        # Build application
-        self.application = Application.builder().token(self.bot_token).build()
+        # Use uvloop where available (not supported on Windows)
+        if sys.platform != 'win32':
+            try:
+                import uvloop
+                asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+                self.logger.info("Using uvloop event loop")
+            except ImportError:
+                pass
+
+        # Build application; updates are handled as independent tasks so one
+        # slow MT5 round-trip doesn't hold up other chats' button presses, and
+        # outgoing calls are throttled to Telegram's flood limits (a 429 that still
+        # gets through is retried after its RetryAfter delay)
+        self.application = (
+            Application.builder()
+            .token(self.bot_token)
+            .concurrent_updates(True)
+            .rate_limiter(AIORateLimiter(max_retries=2))
+            .build()
+        )
 
-        # Add handlers
-        self.application.add_handler(CommandHandler("start", self.start_command))
+        # Add handlers (non-blocking, each update runs as its own task)
+        self.application.add_handler(CommandHandler("start", self.start_command, block=False))
         self.application.add_handler(MessageHandler(
             filters.TEXT & ~filters.COMMAND,
-            self.handle_message
+            self.handle_message,
+            block=False
         ))
-        self.application.add_handler(CallbackQueryHandler(self.handle_callback))
+        self.application.add_handler(CallbackQueryHandler(self.handle_callback, block=False))
 
         # Add job for live display updates (every 1 second)
         self.application.job_queue.run_repeating(
@@ -602,19 +970,30 @@ class TelegramTradingBot:
             first=1.0
         )
 
-        # Add job for trailing stop monitoring (every 1 second)
+        # Add job for trailing stop monitoring (every 1 second, paused while there are no positions)
+        self._start_trailing_job()
+
+        # Add job to refresh cached symbol metadata (every minute)
         self.application.job_queue.run_repeating(
-            self.monitor_trailing_stops,
-            interval=1.0,
-            first=1.0
+            self.refresh_symbol_info,
+            interval=60.0,
+            first=60.0
         )
 
         self.logger.info("Bot started - listening for commands...")
 
-        # Run the bot
-        self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+        # Run the bot: long-poll only the update types we handle, and don't replay
+        # trade commands that queued up while the bot was offline
+        self.application.run_polling(
+            allowed_updates=[Update.MESSAGE, Update.CALLBACK_QUERY],
+            poll_interval=0.0,
+            timeout=30,
+            drop_pending_updates=True
+        )
 
         # Cleanup on exit
+        self._mt5_ready = False
+        self._mt5_executor.shutdown(wait=True)
         if self.connector:
             self.connector.disconnect()
 